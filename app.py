@@ -1,25 +1,436 @@
 import psutil
 import time
+import math
+import atexit
+import signal
 import json
 import os
 import threading
 import csv
 import io
-from datetime import datetime
+import sys
+import re
+import argparse
+import bisect
+import glob
+import urllib.request
+from collections import deque
+from datetime import datetime, timedelta
 from flask import Flask, render_template, jsonify, request, Response, send_from_directory
+try:
+    import fcntl
+except ImportError:  # not on Windows, the data directory is left unlocked there
+    fcntl = None
 
 # Configuration
 DEFAULT_PORT = 7788
 DATA_FILE = "data/traffic_stats.json"
 CONFIG_FILE = "data/config.json"
+LOCK_FILE = "data/monitor.lock"  # held by the process that owns data/ (service or offline replay)
+WEB_PORT = 8899
 UPDATE_INTERVAL = 1
 
+# Adaptive sampling
+MIN_INTERVAL = 0.1          # burst mode sampling interval (seconds)
+MAX_INTERVAL = 10           # back-off limit for idle ports (seconds)
+BURST_HOLD = 5              # stay in burst mode this long after the last sharp change
+BURST_RATIO = 2.0           # 1s rate deviating from the baseline by this fraction counts as sharp
+BURST_MIN_RATE = 256 * 1024 # ...but never less than this many bytes/s
+BURST_CONN_DELTA = 5        # connection count change that counts as sharp
+BASELINE_TAU = 10           # time constant (seconds) of the smoothed baseline rate
+BURST_LOG_INTERVAL = 300    # log burst mode at most this often per port
+SAVE_INTERVAL = 5           # minimum seconds between data file writes
+
+# Persistent event log
+EVENT_LOG_DIR = "data/events"
+EVENT_SEGMENT_BYTES = 1024 * 1024  # rotate segments at this size
+EVENT_MAX_SEGMENTS = 16            # oldest segments beyond this are deleted
+EVENT_TAIL_SIZE = 500              # recent events kept in memory
+EVENT_INDEX_STRIDE = 128           # one id -> byte offset entry per this many events
+
+# Container runtime state (mount read-only when running in Docker)
+DOCKER_STATE_DIR = "/var/lib/docker/containers"
+PODMAN_STATE_FILE = "/var/lib/containers/storage/overlay-containers/containers.json"
+CRIO_STATE_DIR = "/var/lib/containers/storage/overlay-containers"        # <id>/userdata/config.json
+CONTAINERD_STATE_DIR = "/run/containerd/io.containerd.runtime.v2.task"  # <namespace>/<id>/config.json
+CONTAINER_STATS_DAYS = 30  # per-container history kept; containers unseen for longer are dropped
+# Matches ".../docker-<id>.scope", "/docker/<id>", "libpod-<id>", "cri-containerd-<id>" etc.
+CONTAINER_ID_RE = re.compile(r"(docker|libpod|containerd|crio)?[-/:]?([0-9a-f]{64})")
+
 app = Flask(__name__)
 
 @app.route('/favicon.ico')
 def favicon():
     return "", 204
 
+def read_container_id(pid):
+    """Return (container_id, runtime) from /proc/<pid>/cgroup, or None for host processes.
+
+    runtime is None when the path has no runtime prefix (cgroupfs driver).
+    """
+    try:
+        with open(f"/proc/{pid}/cgroup", 'r') as f:
+            lines = f.read().splitlines()
+    except OSError:
+        return None
+    for line in lines:
+        # "hierarchy-ID:controllers:path", v2 has a single "0::path" line
+        path = line.split(":", 2)[-1]
+        matches = CONTAINER_ID_RE.findall(path)
+        if matches:
+            runtime, cid = matches[-1]
+            return cid, runtime or None
+    return None
+
+def read_oci_annotations(path):
+    try:
+        with open(path, 'r') as f:
+            return json.load(f).get("annotations") or {}
+    except Exception:
+        return {}
+
+def k8s_identity(namespace, pod, name):
+    # Container names from a pod spec ("app", "nginx") repeat across pods and namespaces
+    if not name:
+        return None
+    if namespace and pod:
+        return f"{namespace}/{pod}/{name}", name
+    return name, name
+
+def read_runtime_identity(cid, runtime):
+    """(key, name) from one runtime's local state files, or None if it has no such container."""
+    if runtime == "libpod":
+        try:
+            with open(PODMAN_STATE_FILE, 'r') as f:
+                for c in json.load(f):
+                    if c.get("id") == cid and c.get("names"):
+                        return c["names"][0], c["names"][0]
+        except Exception:
+            pass
+    elif runtime == "crio":
+        a = read_oci_annotations(os.path.join(CRIO_STATE_DIR, cid, "userdata", "config.json"))
+        return k8s_identity(a.get("io.kubernetes.pod.namespace"), a.get("io.kubernetes.pod.name"),
+                            a.get("io.kubernetes.container.name"))
+    elif runtime == "containerd":
+        # Namespace is not in the cgroup path (k8s.io, moby, default, ...)
+        for path in glob.glob(os.path.join(CONTAINERD_STATE_DIR, "*", cid, "config.json")):
+            a = read_oci_annotations(path)
+            found = k8s_identity(a.get("io.kubernetes.cri.sandbox-namespace"), a.get("io.kubernetes.cri.sandbox-name"),
+                                 a.get("io.kubernetes.cri.container-name"))
+            if found:
+                return found
+            name = a.get("nerdctl/name")
+            if name:
+                # nerdctl names are unique within a containerd namespace
+                namespace = os.path.basename(os.path.dirname(os.path.dirname(path)))
+                return (name if namespace == "default" else f"{namespace}/{name}"), name
+    elif runtime == "docker":
+        try:
+            with open(os.path.join(DOCKER_STATE_DIR, cid, "config.v2.json"), 'r') as f:
+                config = json.load(f)
+        except Exception:
+            return None
+        labels = config.get("Config", {}).get("Labels") or {}
+        # Prefer the k8s identity over the generated docker name
+        found = k8s_identity(labels.get("io.kubernetes.pod.namespace"), labels.get("io.kubernetes.pod.name"),
+                             labels.get("io.kubernetes.container.name"))
+        if found:
+            return found
+        name = config.get("Name", "").lstrip("/")
+        if name:
+            return name, name
+    return None
+
+def read_container_identity(cid, runtime=None):
+    """Return (key, name) for a container.
+
+    key identifies the container in persisted stats and survives redeploys
+    where the runtime allows (docker/podman names); name is for display.
+    runtime None (cgroupfs paths carry no runtime prefix) tries every runtime.
+    Without state files both fall back to the short ID.
+    """
+    for rt in [runtime] if runtime else ["docker", "crio", "containerd", "libpod"]:
+        found = read_runtime_identity(cid, rt)
+        if found:
+            return found
+    return cid[:12], cid[:12]
+
+def boundary_share(elapsed, into_period):
+    """Fraction of a sample of `elapsed` seconds, ending `into_period` seconds
+    after a minute/day boundary, that belongs to the previous period."""
+    return min(max(elapsed - into_period, 0) / elapsed, 1)
+
+def coverage_contains(intervals, minute):
+    """intervals: sorted, non-overlapping [start, end] epoch-minute ranges (inclusive)."""
+    i = bisect.bisect_right(intervals, [minute, float("inf")]) - 1
+    return i >= 0 and intervals[i][0] <= minute <= intervals[i][1]
+
+def coverage_add(intervals, minute):
+    """Add one epoch minute to a coverage list, merging adjacent ranges."""
+    i = bisect.bisect_right(intervals, [minute, float("inf")])
+    if i > 0 and intervals[i - 1][1] >= minute:
+        return
+    if i > 0 and intervals[i - 1][1] == minute - 1:
+        intervals[i - 1][1] = minute
+        if i < len(intervals) and intervals[i][0] == minute + 1:
+            intervals[i - 1][1] = intervals[i][1]
+            del intervals[i]
+    elif i < len(intervals) and intervals[i][0] == minute + 1:
+        intervals[i][0] = minute
+    else:
+        intervals.insert(i, [minute, minute])
+
+class EventLog:
+    """Append-only event log, stored as size-rotated JSON-lines segments.
+
+    Every event gets an increasing integer id that clients use as a paging
+    cursor. Each segment keeps a small in-memory index (id and time range,
+    ports and sources seen, sparse id -> byte offsets), so a query only
+    opens the segments that can match and seeks close to the cursor.
+    Recent events are also kept in a deque so polling for new events
+    normally never touches the disk.
+    """
+
+    def __init__(self, directory=EVENT_LOG_DIR):
+        self.directory = directory
+        self.lock = threading.Lock()
+        self.tail = deque(maxlen=EVENT_TAIL_SIZE)
+        self.segments = []  # index dicts, oldest first; the last one is active
+        self.next_id = 1
+        self.repaired = False  # active segment checked for a torn last line
+        os.makedirs(directory, exist_ok=True)
+        self.load()
+
+    def segment_path(self, first_id):
+        return os.path.join(self.directory, f"events-{first_id:012d}.jsonl")
+
+    def new_index(self, first_id):
+        return {
+            "path": self.segment_path(first_id), "first_id": first_id, "last_id": first_id - 1,
+            "first_ts": None, "last_ts": None, "size": 0,
+            "ports": set(), "sources": set(), "offsets": []
+        }
+
+    def index_event(self, index, event, offset, size):
+        if index["first_ts"] is None:
+            index["first_ts"] = event["ts"]
+        index["last_id"] = event["id"]
+        index["last_ts"] = event["ts"]
+        index["sources"].add(event["source"])
+        if event.get("port") is not None:
+            index["ports"].add(event["port"])
+        if (event["id"] - index["first_id"]) % EVENT_INDEX_STRIDE == 0:
+            index["offsets"].append((event["id"], offset))
+        index["size"] = offset + size
+
+    def scan_segment(self, path, first_id):
+        """Rebuild a segment index (and return its events) by reading the file."""
+        index = self.new_index(first_id)
+        events = []
+        offset = 0
+        with open(path, 'rb') as f:
+            for line in f:
+                try:
+                    event = json.loads(line)
+                    self.index_event(index, event, offset, len(line))
+                    events.append(event)
+                except (ValueError, KeyError):
+                    pass  # torn write from a crash
+                offset += len(line)
+        index["size"] = offset
+        return index, events
+
+    def repair_segment(self, path, size):
+        """Cut a torn trailing line left by a crash so new appends start on a fresh line.
+
+        Returns the new segment size.
+        """
+        try:
+            with open(path, 'rb+') as f:
+                data = f.read()
+                end = data.rfind(b"\n") + 1
+                if end < len(data):
+                    f.truncate(end)
+                return end
+        except OSError:
+            return size
+
+    def save_index(self, index):
+        sidecar = dict(index, ports=sorted(index["ports"]), sources=sorted(index["sources"]))
+        del sidecar["path"]
+        try:
+            with open(index["path"][:-len(".jsonl")] + ".idx.json", 'w') as f:
+                json.dump(sidecar, f)
+        except OSError:
+            pass
+
+    def load_index(self, path):
+        try:
+            with open(path[:-len(".jsonl")] + ".idx.json", 'r') as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return None
+        index.update({
+            "path": path, "ports": set(index["ports"]), "sources": set(index["sources"]),
+            "offsets": [tuple(o) for o in index["offsets"]]
+        })
+        return index
+
+    def load(self):
+        names = sorted(n for n in os.listdir(self.directory) if n.startswith("events-") and n.endswith(".jsonl"))
+        for i, name in enumerate(names):
+            path = os.path.join(self.directory, name)
+            first_id = int(name[len("events-"):-len(".jsonl")])
+            active = i == len(names) - 1
+            index = None if active else self.load_index(path)
+            if index is None:
+                index, events = self.scan_segment(path, first_id)
+                if active:
+                    self.tail.extend(events)
+                else:
+                    self.save_index(index)
+            self.segments.append(index)
+        if self.segments:
+            self.next_id = max(s["last_id"] for s in self.segments) + 1
+        if not self.segments or self.segments[-1]["size"] >= EVENT_SEGMENT_BYTES:
+            self.rotate()
+
+    def rotate(self):
+        # Seal the active segment and start a new one
+        if self.segments:
+            self.save_index(self.segments[-1])
+        self.segments.append(self.new_index(self.next_id))
+        while len(self.segments) > EVENT_MAX_SEGMENTS:
+            old = self.segments.pop(0)
+            for path in (old["path"], old["path"][:-len(".jsonl")] + ".idx.json"):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def append(self, source, message, port=None):
+        with self.lock:
+            now = time.time()
+            event = {
+                "id": self.next_id,
+                "ts": now,
+                "time": datetime.fromtimestamp(now).strftime("%Y-%m-%d %H:%M:%S"),
+                "source": source,
+                "message": message,
+                "port": port
+            }
+            self.next_id += 1
+            self.tail.append(event)
+
+            index = self.segments[-1]
+            if not self.repaired:
+                # Done on the first write rather than in load(), so a process that
+                # only reads the log (e.g. replay next to the service) never changes it
+                index["size"] = self.repair_segment(index["path"], index["size"])
+                self.repaired = True
+            line = (json.dumps(event, ensure_ascii=False) + "\n").encode("utf-8")
+            try:
+                with open(index["path"], 'ab') as f:
+                    f.write(line)
+            except OSError:
+                return event  # keep running on a read-only / full disk, tail still works
+            self.index_event(index, event, index["size"], len(line))
+            if index["size"] >= EVENT_SEGMENT_BYTES:
+                self.rotate()
+            return event
+
+    def read_segment(self, index, since, before, match):
+        """Yield matching events from one segment with since < id < before."""
+        offset = 0
+        for event_id, event_offset in index["offsets"]:
+            if event_id > since:
+                break
+            offset = event_offset
+        try:
+            with open(index["path"], 'rb') as f:
+                f.seek(offset)
+                for line in f:
+                    try:
+                        event = json.loads(line)
+                    except ValueError:
+                        continue
+                    if event["id"] >= before:
+                        break
+                    if event["id"] > since and match(event):
+                        yield event
+        except OSError:
+            return
+
+    def query(self, since=None, before=None, port=None, source=None, start=None, end=None, limit=50):
+        """Return up to `limit` events in id order.
+
+        since:  only events newer than this id (forward paging, oldest first)
+        before: only events older than this id (backward paging, newest `limit`)
+        Without `since` the newest matching events are returned.
+        """
+        def match(event):
+            return ((port is None or event.get("port") == port) and
+                    (source is None or event["source"] == source) and
+                    (start is None or event["ts"] >= start) and
+                    (end is None or event["ts"] <= end))
+
+        lower = since if since is not None else 0
+        upper = before if before is not None else float("inf")
+        forward = since is not None
+
+        def segment_may_match(index):
+            if index["last_id"] < index["first_id"]:
+                return False  # empty
+            if index["last_id"] <= lower or index["first_id"] >= upper:
+                return False
+            if port is not None and port not in index["ports"]:
+                return False
+            if source is not None and source not in index["sources"]:
+                return False
+            if start is not None and index["last_ts"] < start:
+                return False
+            if end is not None and index["first_ts"] > end:
+                return False
+            return True
+
+        with self.lock:
+            tail = list(self.tail)
+            segments = [dict(s) for s in self.segments if segment_may_match(s)]
+
+        # Serve from the in-memory tail when it covers the requested range
+        if tail:
+            covered = lower + 1 >= tail[0]["id"]
+            hits = [e for e in tail if lower < e["id"] < upper and match(e)]
+            if forward and covered:
+                return hits[:limit], len(hits) > limit
+            if not forward and (covered or len(hits) >= limit):
+                page = hits[-limit:]
+                oldest = page[0]["id"] if page else upper
+                # The segment indexes only say a port/source may occur, so confirm
+                # an older match really exists before reporting more
+                more = len(hits) > limit or (not covered and any(
+                    next(self.read_segment(s, lower, oldest, match), None) is not None
+                    for s in reversed(segments) if s["first_id"] < oldest))
+                return page, more
+
+        if forward:
+            events = []
+            for index in segments:
+                for event in self.read_segment(index, lower, upper, match):
+                    events.append(event)
+                    if len(events) > limit:
+                        return events[:limit], True
+            return events, False
+
+        # Backward: walk segments newest first, keeping only the newest `limit`
+        collected = []
+        for index in reversed(segments):
+            found = deque(self.read_segment(index, lower, upper, match), maxlen=limit + 1)
+            collected = list(found) + collected
+            if len(collected) > limit:
+                return collected[-limit:], True
+        return collected, False
+
 class TrafficMonitor:
     def __init__(self):
         # Ensure data directory exists
@@ -32,7 +443,7 @@ class TrafficMonitor:
         
         # Runtime states
         self.current_stats = {
-            port: {"up": 0, "down": 0, "pids": [], "process_names": [], "connections": 0} 
+            port: {"up": 0, "down": 0, "pids": [], "process_names": [], "containers": [], "connections": 0} 
             for port in self.ports
         }
         self.lock = threading.Lock()
@@ -53,16 +464,51 @@ class TrafficMonitor:
         # Temporary bucket for minute aggregation
         self.minute_buckets = {}
         self.reset_buckets()
+
+        # Container attribution
+        # container_cache: { "pid_createtime": {"id", "key", "name"} or None }, only new PIDs hit /proc
+        # container_names: { short_id: (key, name) }, runtime state files are read once per live container
+        self.container_cache = {}
+        self.container_names = {}
+        self.container_stats = {}  # { key: {"name", "ids", "up", "down", "connections", "ports", "pids"} }
+        self.port_containers = {}  # { port: { short_id: {...} } } from each port's last sample
+
+        # Adaptive sampling state
+        self.schedule = {}      # { port: {"interval", "rate", "conns", "burst_until", "next"} }
+        self.last_sample = {}   # { port: monotonic time of last sample }
+        self.port_keys = {}     # { port: set of pid_createtime keys seen at last sample }
+        self.host_probe = {"time": 0, "bytes": None, "rate": 0}
+        self.last_save = 0
+        self.last_scan = 0
+        self.port_info = {}     # { port: {"pids", "conns", "pid_conns"} } from the last socket scan
+        self.processes = {}     # { pid: {"proc", "key", "name", "container"} } for PIDs of the last scan
+        if "container_stats" not in self.data:
+            self.data["container_stats"] = {}        # { key: {"name", "upload", "download", "last_seen"} }
+        # { "7788": [[start_minute, end_minute], ...] } epoch minutes already counted (live or replayed)
+        if "minute_coverage" not in self.data:
+            self.data["minute_coverage"] = {}
+        if "container_daily_stats" not in self.data:
+            self.data["container_daily_stats"] = {}  # { "2023-10-01": { key: {"upload", "download"} } }
         
-        # In-memory Event Log (Keep last 50 events)
-        self.event_log = []
-        self.log_event("系统", "监控服务已启动")
+        # Persistent Event Log (segmented files + in-memory tail)
+        self.events = EventLog()
+        self.lock_file = None  # kept open while this process owns data/ (see acquire_lock)
+
+    def log_event(self, source, message, port=None):
+        self.events.append(source, message, port)
 
-    def log_event(self, source, message):
-        timestamp = datetime.now().strftime("%H:%M:%S")
-        self.event_log.insert(0, {"time": timestamp, "source": source, "message": message})
-        if len(self.event_log) > 50:
-            self.event_log.pop()
+    def acquire_lock(self):
+        """Take the data directory lock; False if another process already owns data/."""
+        if fcntl is None:
+            return True
+        self.lock_file = open(LOCK_FILE, 'a')
+        try:
+            fcntl.flock(self.lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            self.lock_file.close()
+            self.lock_file = None
+            return False
+        return True
 
     def load_config(self):
         if os.path.exists(CONFIG_FILE):
@@ -107,11 +553,11 @@ class TrafficMonitor:
             port = int(port)
             if port not in self.ports:
                 self.ports.add(port)
-                self.current_stats[port] = {"up": 0, "down": 0, "pids": [], "process_names": [], "connections": 0}
+                self.current_stats[port] = {"up": 0, "down": 0, "pids": [], "process_names": [], "containers": [], "connections": 0}
                 if str(port) not in self.data["traffic_series"]:
                     self.data["traffic_series"][str(port)] = []
                 self.save_config()
-                self.log_event("系统", f"添加监控端口 {port}")
+                self.log_event("系统", f"添加监控端口 {port}", port)
                 return True
         return False
 
@@ -123,20 +569,41 @@ class TrafficMonitor:
                 if port in self.current_stats:
                     del self.current_stats[port]
                 self.save_config()
-                self.log_event("系统", f"移除监控端口 {port}")
+                self.log_event("系统", f"移除监控端口 {port}", port)
                 return True
         return False
 
     def reset_buckets(self):
-        current_min = datetime.now().minute
+        current_min = datetime.now().strftime("%Y-%m-%d %H:%M")
         for port in self.ports:
             if str(port) not in self.minute_buckets:
-                self.minute_buckets[str(port)] = {
-                    "up": 0, "down": 0, "count": 0, "last_minute": current_min
-                }
+                self.minute_buckets[str(port)] = self.new_bucket(current_min)
+
+    def resolve_container(self, pid, key):
+        """Container info for a process, cached by its pid_createtime key."""
+        if key in self.container_cache:
+            return self.container_cache[key]
+        info = None
+        found = read_container_id(pid)
+        if found:
+            cid, runtime = found
+            if cid[:12] not in self.container_names:
+                self.container_names[cid[:12]] = read_container_identity(cid, runtime)
+            stats_key, name = self.container_names[cid[:12]]
+            info = {"id": cid[:12], "key": stats_key, "name": name}
+        self.container_cache[key] = info
+        return info
+
+    def prune_container_cache(self, active_keys):
+        """Forget exited processes, and names of containers none of them belong to."""
+        for k in [k for k in self.container_cache if k not in active_keys]:
+            del self.container_cache[k]
+        live_ids = {info["id"] for info in self.container_cache.values() if info}
+        for cid in [c for c in self.container_names if c not in live_ids]:
+            del self.container_names[cid]
 
     def get_port_pids_and_conns(self):
-        port_info = {port: {"pids": set(), "conns": 0} for port in self.ports}
+        port_info = {port: {"pids": set(), "conns": 0, "pid_conns": {}} for port in self.ports}
         try:
             connections = psutil.net_connections(kind='inet')
             for conn in connections:
@@ -144,6 +611,9 @@ class TrafficMonitor:
                     # Count ESTABLISHED connections
                     if conn.status == psutil.CONN_ESTABLISHED:
                          port_info[conn.laddr.port]["conns"] += 1
+                         if conn.pid:
+                             pid_conns = port_info[conn.laddr.port]["pid_conns"]
+                             pid_conns[conn.pid] = pid_conns.get(conn.pid, 0) + 1
                          
                     if conn.pid:
                         port_info[conn.laddr.port]["pids"].add(conn.pid)
@@ -152,21 +622,203 @@ class TrafficMonitor:
         
         # Convert set to list
         return {
-            k: {"pids": list(v["pids"]), "conns": v["conns"]} 
+            k: {"pids": list(v["pids"]), "conns": v["conns"], "pid_conns": v["pid_conns"]}
             for k, v in port_info.items()
         }
 
     def update_loop(self):
         while True:
-            self.update()
-            time.sleep(UPDATE_INTERVAL)
+            now = time.monotonic()
+            if self.host_activity_changed(now):
+                # Something moved on the host: sample backed-off ports right away
+                with self.lock:
+                    for sched in self.schedule.values():
+                        sched["next"] = now
+
+            with self.lock:
+                due = [p for p in self.ports if self.schedule.get(p, {}).get("next", 0) <= now]
+            if due:
+                self.update(due)
+
+            with self.lock:
+                next_due = min((self.schedule[p]["next"] for p in self.ports if p in self.schedule),
+                               default=now + UPDATE_INTERVAL)
+            # Wake for the next due port, or for the next host probe
+            wake = min(next_due, self.host_probe["time"] + UPDATE_INTERVAL)
+            time.sleep(max(wake - time.monotonic(), 0.01))
+
+    def host_activity_changed(self, now):
+        """Cheap host-wide probe (/proc/net/dev), at most once per UPDATE_INTERVAL."""
+        probe = self.host_probe
+        if now - probe["time"] < UPDATE_INTERVAL:
+            return False
+        try:
+            counters = psutil.net_io_counters()
+            total_bytes = counters.bytes_sent + counters.bytes_recv
+        except Exception:
+            return False
+        changed = False
+        rate = 0
+        if probe["bytes"] is not None:
+            rate = max(total_bytes - probe["bytes"], 0) / (now - probe["time"])
+            changed = abs(rate - probe["rate"]) > max(BURST_MIN_RATE, probe["rate"] * BURST_RATIO)
+        self.host_probe = {"time": now, "bytes": total_bytes, "rate": rate}
+        return changed
+
+    def schedule_next(self, port, now, delta_bytes, elapsed, conns):
+        """Pick the next sampling interval for a port from how much it just changed.
 
-    def update(self):
-        port_info_map = self.get_port_pids_and_conns()
+        Samples are accumulated into windows of at least UPDATE_INTERVAL and
+        each window's rate is compared against an EWMA baseline, so traffic
+        that is merely chunky at 100ms granularity does not keep burst mode on.
+        """
+        sched = self.schedule.get(port)
+        if sched is None:
+            sched = self.schedule[port] = {
+                "interval": UPDATE_INTERVAL, "baseline": None, "conns": conns, "burst_until": 0,
+                "next": now, "win_bytes": 0, "win_seconds": 0, "last_burst_log": None
+            }
+
+        sched["win_bytes"] += delta_bytes
+        sched["win_seconds"] += elapsed
+        idle = False
+        if sched["win_seconds"] >= UPDATE_INTERVAL:
+            rate = sched["win_bytes"] / sched["win_seconds"]
+            if sched["baseline"] is None:
+                sched["baseline"] = rate
+            else:
+                baseline = sched["baseline"]
+                rate_jump = abs(rate - baseline) > max(BURST_MIN_RATE, baseline * BURST_RATIO)
+                conn_jump = abs(conns - sched["conns"]) >= BURST_CONN_DELTA
+                if rate_jump or conn_jump:
+                    last_log = sched["last_burst_log"]
+                    if now >= sched["burst_until"] and (last_log is None or now - last_log >= BURST_LOG_INTERVAL):
+                        self.log_event(f"Port {port}", "流量突变，进入高频采样", port)
+                        sched["last_burst_log"] = now
+                    sched["burst_until"] = now + BURST_HOLD
+                alpha = 1 - math.exp(-sched["win_seconds"] / BASELINE_TAU)
+                sched["baseline"] = baseline + alpha * (rate - baseline)
+            idle = rate == 0 and conns == 0
+            sched["conns"] = conns
+            sched["win_bytes"] = 0
+            sched["win_seconds"] = 0
+
+        if now < sched["burst_until"]:
+            interval = MIN_INTERVAL
+        elif idle:
+            # Idle: back off exponentially
+            interval = min(max(sched["interval"], UPDATE_INTERVAL) * 2, MAX_INTERVAL)
+        else:
+            interval = UPDATE_INTERVAL
+
+        sched["interval"] = interval
+        sched["next"] = now + interval
+
+    def add_daily(self, day, str_port, up, down, online):
+        daily = self.data["daily_stats"].setdefault(day, {}).setdefault(
+            str_port, {"upload": 0, "download": 0, "online_seconds": 0})
+        daily["upload"] += up
+        daily["download"] += down
+        daily["online_seconds"] += online
+
+    def shutdown(self):
+        # Writes are throttled to SAVE_INTERVAL, flush the remainder on exit
+        with self.lock:
+            self.save_data()
+
+    def new_bucket(self, minute):
+        return {"up": 0, "down": 0, "seconds": 0, "peak_up": 0, "peak_down": 0, "minute": minute}
+
+    def add_to_bucket(self, bucket, seconds, up, down, rate_up, rate_down):
+        bucket["up"] += up
+        bucket["down"] += down
+        bucket["seconds"] += seconds
+        bucket["peak_up"] = max(bucket["peak_up"], rate_up)
+        bucket["peak_down"] = max(bucket["peak_down"], rate_down)
+
+    def flush_bucket(self, str_port, bucket):
+        if bucket["seconds"] <= 0:
+            return
+        # Remember which minutes were recorded live, replays must not add them again
+        epoch_minute = int(datetime.strptime(bucket["minute"], "%Y-%m-%d %H:%M").timestamp()) // 60
+        coverage_add(self.data["minute_coverage"].setdefault(str_port, []), epoch_minute)
+        series = self.data["traffic_series"].setdefault(str_port, [])
+        series.append({
+            "time": bucket["minute"][-5:],
+            "up": bucket["up"] / bucket["seconds"],
+            "down": bucket["down"] / bucket["seconds"],
+            "peak_up": bucket["peak_up"],
+            "peak_down": bucket["peak_down"],
+            "full_time": bucket["minute"]
+        })
+        # Keep last 1440 points
+        if len(series) > 1440:
+            self.data["traffic_series"][str_port] = series[-1440:]
+
+    def roll_minute(self, str_port, now_dt, elapsed, up, down):
+        """Add one variable-length sample to the port's minute bucket.
+
+        Averages are weighted by sampled time, and a sample that straddles a
+        minute boundary is split between the two minutes. Returns True when a
+        finished minute was flushed to traffic_series.
+        """
+        minute = now_dt.strftime("%Y-%m-%d %H:%M")
+        bucket = self.minute_buckets.get(str_port)
+        if bucket is None:
+            bucket = self.minute_buckets[str_port] = self.new_bucket(minute)
+        rate_up = up / elapsed
+        rate_down = down / elapsed
+
+        flushed = False
+        if bucket["minute"] != minute:
+            share = boundary_share(elapsed, now_dt.second + now_dt.microsecond / 1e6)
+            if share > 0:
+                self.add_to_bucket(bucket, share * elapsed, share * up, share * down, rate_up, rate_down)
+            self.flush_bucket(str_port, bucket)
+            flushed = True
+            bucket = self.minute_buckets[str_port] = self.new_bucket(minute)
+            elapsed, up, down = (1 - share) * elapsed, (1 - share) * up, (1 - share) * down
+
+        self.add_to_bucket(bucket, elapsed, up, down, rate_up, rate_down)
+        return flushed
+
+    def refresh_processes(self):
+        """Cache a psutil.Process (with its key, name and container) per PID of the last scan."""
+        pids = set().union(*(info["pids"] for info in self.port_info.values()))
+        for pid in [p for p in self.processes if p not in pids]:
+            del self.processes[pid]
+        for pid in pids:
+            entry = self.processes.get(pid)
+            if entry is not None and entry["proc"].is_running():
+                continue
+            try:
+                p = psutil.Process(pid)
+                key = f"{pid}_{int(p.create_time())}"
+                try:
+                    name = p.name()
+                except:
+                    name = None
+            except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+                self.processes.pop(pid, None)
+                continue
+            self.processes[pid] = {"proc": p, "key": key, "name": name, "container": self.resolve_container(pid, key)}
+
+    def update(self, ports=None):
+        # The host-wide socket scan walks every process's fds: run it at most once
+        # per UPDATE_INTERVAL, burst ticks in between reuse the cached PIDs
+        ports = list(ports if ports is not None else self.ports)
+        port_info_map = None
+        if time.monotonic() - self.last_scan >= UPDATE_INTERVAL or any(p not in self.port_info for p in ports):
+            port_info_map = self.get_port_pids_and_conns()
         
         with self.lock:
-            today = datetime.now().strftime("%Y-%m-%d")
-            current_minute = datetime.now().minute
+            now = time.monotonic()
+            if port_info_map is not None:
+                self.port_info = port_info_map
+                self.last_scan = now
+                self.refresh_processes()
+            now_dt = datetime.now()
+            today = now_dt.strftime("%Y-%m-%d")
             
             # Initialize daily stats structure
             if today not in self.data["daily_stats"]:
@@ -175,24 +827,35 @@ class TrafficMonitor:
             # Initialize total stats structure
             if "total_stats" not in self.data:
                 self.data["total_stats"] = {}
+            if today not in self.data["container_daily_stats"]:
+                self.data["container_daily_stats"][today] = {}
+                self.prune_container_stats(now_dt)
 
-            active_keys = set()
+            # Only sample ports that are due (default: all)
+            ports = [p for p in ports if p in self.ports]
+            series_changed = False
             
-            for port in self.ports:
+            for port in ports:
                 str_port = str(port)
-                info = port_info_map.get(port, {"pids": [], "conns": 0})
+                info = self.port_info.get(port, {"pids": [], "conns": 0, "pid_conns": {}})
                 pids = info["pids"]
+
+                # Real time since this port was last sampled
+                elapsed = now - self.last_sample[port] if port in self.last_sample else UPDATE_INTERVAL
+                elapsed = max(elapsed, 1e-3)
+                self.last_sample[port] = now
                 
                 # Detect state changes for logging
                 prev_pids = self.current_stats[port]["pids"]
                 if not prev_pids and pids:
-                    self.log_event(f"Port {port}", "检测到活动进程")
+                    self.log_event(f"Port {port}", "检测到活动进程", port)
                 elif prev_pids and not pids:
-                    self.log_event(f"Port {port}", "进程已停止/断开")
+                    self.log_event(f"Port {port}", "进程已停止/断开", port)
 
                 self.current_stats[port]["pids"] = pids
                 self.current_stats[port]["connections"] = info["conns"]
                 self.current_stats[port]["process_names"] = [] # will fill below
+                self.current_stats[port]["containers"] = []
                 
                 # Init stats for this port if missing
                 if str_port not in self.data["daily_stats"][today]:
@@ -203,30 +866,39 @@ class TrafficMonitor:
                     self.data["total_stats"][str_port] = {
                         "upload": 0, "download": 0, "online_seconds": 0
                     }
-                if str_port not in self.minute_buckets: # Handle newly added ports
-                    self.minute_buckets[str_port] = {
-                        "up": 0, "down": 0, "count": 0, "last_minute": current_minute
-                    }
 
-                daily = self.data["daily_stats"][today][str_port]
                 total = self.data["total_stats"][str_port]
 
                 port_delta_up = 0
                 port_delta_down = 0
+                port_keys = set()
+                port_containers = {}  # per-container deltas on this port
 
                 for pid in pids:
+                    entry = self.processes.get(pid)
+                    if entry is None:
+                        continue
                     try:
-                        p = psutil.Process(pid)
+                        p = entry["proc"]
                         # Collect process name
-                        try:
-                            proc_name = p.name()
-                            if proc_name not in self.current_stats[port]["process_names"]:
-                                self.current_stats[port]["process_names"].append(proc_name)
-                        except:
-                            pass
+                        proc_name = entry["name"]
+                        if proc_name and proc_name not in self.current_stats[port]["process_names"]:
+                            self.current_stats[port]["process_names"].append(proc_name)
                         
-                        key = f"{pid}_{int(p.create_time())}"
-                        active_keys.add(key)
+                        key = entry["key"]
+                        port_keys.add(key)
+
+                        container = entry["container"]
+                        if container:
+                            if container not in self.current_stats[port]["containers"]:
+                                self.current_stats[port]["containers"].append(container)
+                            tick = port_containers.setdefault(container["id"], {
+                                "key": container["key"], "name": container["name"],
+                                "up": 0, "down": 0, "connections": 0, "pids": []
+                            })
+                            if pid not in tick["pids"]:
+                                tick["pids"].append(pid)
+                            tick["connections"] += info["pid_conns"].get(pid, 0)
                         
                         io = p.io_counters()
                         curr_read = io.read_bytes
@@ -246,6 +918,9 @@ class TrafficMonitor:
                         
                         port_delta_up += delta_write
                         port_delta_down += delta_read
+                        if container:
+                            tick["up"] += delta_write
+                            tick["down"] += delta_read
                         
                         self.data["process_states"][key] = {
                             "read": curr_read,
@@ -254,57 +929,85 @@ class TrafficMonitor:
                     except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
                         continue
 
-                if port_delta_up > 0 or port_delta_down > 0:
-                    daily["online_seconds"] += UPDATE_INTERVAL
-                    total["online_seconds"] += UPDATE_INTERVAL
+                self.port_keys[port] = port_keys
 
-                # Update accumulated stats
-                daily["upload"] += port_delta_up
-                daily["download"] += port_delta_down
+                # Credit at most one base interval of online time per sample, so a
+                # single request on a backed-off port does not count as 10s online
+                online = min(elapsed, UPDATE_INTERVAL) if port_delta_up > 0 or port_delta_down > 0 else 0
+                total["online_seconds"] += online
+
+                # Update accumulated stats (split across midnight like minute buckets)
+                into_day = now_dt.hour * 3600 + now_dt.minute * 60 + now_dt.second + now_dt.microsecond / 1e6
+                share = boundary_share(elapsed, into_day)
+                if share > 0:
+                    yesterday = (now_dt - timedelta(days=1)).strftime("%Y-%m-%d")
+                    up_before = round(port_delta_up * share)
+                    down_before = round(port_delta_down * share)
+                    self.add_daily(yesterday, str_port, up_before, down_before, online * share)
+                    self.add_daily(today, str_port, port_delta_up - up_before, port_delta_down - down_before, online * (1 - share))
+                else:
+                    self.add_daily(today, str_port, port_delta_up, port_delta_down, online)
                 total["upload"] += port_delta_up
                 total["download"] += port_delta_down
                 
-                # Update current speed
-                self.current_stats[port]["up"] = port_delta_up / UPDATE_INTERVAL
-                self.current_stats[port]["down"] = port_delta_down / UPDATE_INTERVAL
+                # Update current speed, normalized by real elapsed time
+                self.current_stats[port]["up"] = port_delta_up / elapsed
+                self.current_stats[port]["down"] = port_delta_down / elapsed
                 
                 # --- Minute Aggregation for 24h Trend ---
-                bucket = self.minute_buckets[str_port]
-                bucket["up"] += self.current_stats[port]["up"]
-                bucket["down"] += self.current_stats[port]["down"]
-                bucket["count"] += 1
-                
-                if current_minute != bucket["last_minute"]:
-                    if bucket["count"] > 0:
-                        avg_up = bucket["up"] / bucket["count"]
-                        avg_down = bucket["down"] / bucket["count"]
-                        timestamp = datetime.now().strftime("%H:%M")
-                        
-                        if str_port not in self.data["traffic_series"]:
-                             self.data["traffic_series"][str_port] = []
-                             
-                        self.data["traffic_series"][str_port].append({
-                            "time": timestamp,
-                            "up": avg_up,
-                            "down": avg_down,
-                            "full_time": datetime.now().strftime("%Y-%m-%d %H:%M")
-                        })
-                        
-                        # Keep last 1440 points
-                        if len(self.data["traffic_series"][str_port]) > 1440:
-                            self.data["traffic_series"][str_port] = self.data["traffic_series"][str_port][-1440:]
-                    
-                    # Reset bucket
-                    self.minute_buckets[str_port] = {
-                        "up": 0, "down": 0, "count": 0, "last_minute": current_minute
-                    }
+                if self.roll_minute(str_port, now_dt, elapsed, port_delta_up, port_delta_down):
+                    series_changed = True
+
+                # --- Per-container accumulation ---
+                # Persisted by identity key: names survive redeploys, container IDs do not
+                for cid, tick in port_containers.items():
+                    c_total = self.data["container_stats"].setdefault(tick["key"], {"upload": 0, "download": 0})
+                    c_daily = self.data["container_daily_stats"][today].setdefault(tick["key"], {"upload": 0, "download": 0})
+                    c_total["name"] = tick["name"]
+                    c_total["last_seen"] = today
+                    c_total["upload"] += tick["up"]
+                    c_total["download"] += tick["down"]
+                    c_daily["upload"] += tick["up"]
+                    c_daily["download"] += tick["down"]
+                    tick["up"] /= elapsed
+                    tick["down"] /= elapsed
+                self.port_containers[port] = port_containers
 
-            # Clean up old process states
+                self.schedule_next(port, now, port_delta_up + port_delta_down, elapsed, info["conns"])
+
+            # Forget ports that were removed
+            for state in (self.port_keys, self.port_containers, self.last_sample, self.schedule):
+                for port in [p for p in state if p not in self.ports]:
+                    del state[port]
+
+            # Clean up old process states (keys still held by any port stay)
+            active_keys = set().union(*self.port_keys.values())
             keys_to_remove = [k for k in self.data["process_states"] if k not in active_keys]
             for k in keys_to_remove:
                 del self.data["process_states"][k]
-            
-            self.save_data()
+            self.prune_container_cache(active_keys)
+
+            # Current per-container view across all ports
+            container_stats = {}
+            for port, port_containers in self.port_containers.items():
+                for cid, tick in port_containers.items():
+                    merged = container_stats.setdefault(tick["key"], {
+                        "name": tick["name"], "ids": [], "up": 0, "down": 0, "connections": 0, "ports": [], "pids": []
+                    })
+                    if cid not in merged["ids"]:
+                        merged["ids"].append(cid)
+                    merged["up"] += tick["up"]
+                    merged["down"] += tick["down"]
+                    merged["connections"] += tick["connections"]
+                    if port not in merged["ports"]:
+                        merged["ports"].append(port)
+                    merged["pids"].extend(p for p in tick["pids"] if p not in merged["pids"])
+            self.container_stats = container_stats
+
+            # Throttle disk writes, bursts would otherwise write JSON every 100ms
+            if series_changed or now - self.last_save >= SAVE_INTERVAL:
+                self.save_data()
+                self.last_save = now
 
     def get_system_stats(self):
         """Get global system resource usage"""
@@ -336,7 +1039,7 @@ class TrafficMonitor:
                 self.data["traffic_series"][str_port] = []
             
             self.save_data()
-            self.log_event(f"Port {port}", "数据已重置")
+            self.log_event(f"Port {port}", "数据已重置", port)
             return True
 
     def get_port_stats(self, port):
@@ -353,15 +1056,17 @@ class TrafficMonitor:
             if "total_stats" in self.data and str_port in self.data["total_stats"]:
                 total = self.data["total_stats"][str_port]
             
-            curr = self.current_stats.get(port, {"up": 0, "down": 0, "pids": [], "process_names": [], "connections": 0})
+            curr = self.current_stats.get(port, {"up": 0, "down": 0, "pids": [], "process_names": [], "containers": [], "connections": 0})
             
             return {
                 "port": port,
                 "active_pids": curr["pids"],
                 "process_names": curr["process_names"],
+                "containers": curr.get("containers", []),
                 "connections": curr["connections"],
                 "current_speed_up": curr["up"],
                 "current_speed_down": curr["down"],
+                "sample_interval": self.schedule.get(port, {}).get("interval", UPDATE_INTERVAL),
                 "total_upload": total["upload"],
                 "total_download": total["download"],
                 "total_online_seconds": total["online_seconds"],
@@ -370,19 +1075,173 @@ class TrafficMonitor:
                 "today_online_seconds": daily["online_seconds"]
             }
 
+    def merge_replay(self, minutes):
+        """Merge per-minute results from a pcap replay into the store.
+
+        minutes: {(port, minute_epoch): [upload, download, second_mask]}
+        Minutes already counted (recorded live or by an earlier replay, as kept
+        in minute_coverage, or still present in traffic_series) are skipped, so
+        overlapping or repeated replays are not double counted.
+        """
+        summary = {}
+        seen = {}
+        with self.lock:
+            if "total_stats" not in self.data:
+                self.data["total_stats"] = {}
+
+            for (port, minute), (up, down, mask) in sorted(minutes.items()):
+                str_port = str(port)
+                series = self.data["traffic_series"].setdefault(str_port, [])
+                coverage = self.data["minute_coverage"].setdefault(str_port, [])
+                port_summary = summary.setdefault(port, {"minutes": 0, "skipped": 0, "upload": 0, "download": 0})
+                if port not in seen:
+                    seen[port] = {p.get("full_time") for p in series}
+
+                dt = datetime.fromtimestamp(minute * 60)
+                full_time = dt.strftime("%Y-%m-%d %H:%M")
+                if full_time in seen[port] or coverage_contains(coverage, minute):
+                    port_summary["skipped"] += 1
+                    continue
+                coverage_add(coverage, minute)
+
+                series.append({
+                    "time": dt.strftime("%H:%M"),
+                    "up": up / 60,
+                    "down": down / 60,
+                    "full_time": full_time
+                })
+
+                day = dt.strftime("%Y-%m-%d")
+                daily = self.data["daily_stats"].setdefault(day, {}).setdefault(
+                    str_port, {"upload": 0, "download": 0, "online_seconds": 0})
+                total = self.data["total_stats"].setdefault(
+                    str_port, {"upload": 0, "download": 0, "online_seconds": 0})
+                online = bin(mask).count("1")
+                for stats in (daily, total):
+                    stats["upload"] += up
+                    stats["download"] += down
+                    stats["online_seconds"] += online
+
+                port_summary["minutes"] += 1
+                port_summary["upload"] += up
+                port_summary["download"] += down
+
+            for port in summary:
+                # Keep series in time order and within the 24h window
+                series = sorted(self.data["traffic_series"][str(port)], key=lambda p: p.get("full_time", ""))
+                self.data["traffic_series"][str(port)] = series[-1440:]
+
+            self.save_data()
+            self.log_event("系统", f"已导入抓包数据 ({sum(s['minutes'] for s in summary.values())} 分钟)")
+        return summary
+
+    def prune_container_stats(self, now_dt):
+        """Drop per-container history older than CONTAINER_STATS_DAYS (called once a day)."""
+        cutoff = (now_dt - timedelta(days=CONTAINER_STATS_DAYS)).strftime("%Y-%m-%d")
+        for day in [d for d in self.data["container_daily_stats"] if d < cutoff]:
+            del self.data["container_daily_stats"][day]
+        for key in [k for k, t in self.data["container_stats"].items() if t.get("last_seen", "") < cutoff]:
+            del self.data["container_stats"][key]
+
+    def get_container_stats(self):
+        with self.lock:
+            today = datetime.now().strftime("%Y-%m-%d")
+            daily_all = self.data["container_daily_stats"].get(today, {})
+            result = []
+            for key, total in self.data["container_stats"].items():
+                curr = self.container_stats.get(key, {"ids": [], "up": 0, "down": 0, "connections": 0, "ports": [], "pids": []})
+                daily = daily_all.get(key, {"upload": 0, "download": 0})
+                result.append({
+                    "key": key,
+                    "name": total.get("name", key),
+                    "ids": curr["ids"],
+                    "active": key in self.container_stats,
+                    "last_seen": total.get("last_seen"),
+                    "ports": curr["ports"],
+                    "pids": curr["pids"],
+                    "connections": curr["connections"],
+                    "current_speed_up": curr["up"],
+                    "current_speed_down": curr["down"],
+                    "today_upload": daily["upload"],
+                    "today_download": daily["download"],
+                    "total_upload": total["upload"],
+                    "total_download": total["download"]
+                })
+            return result
+
     def get_all_ports_summary(self):
         with self.lock:
             return list(self.ports)
             
-    def get_logs(self):
-        return self.event_log
+    def get_logs(self, **query):
+        return self.events.query(**query)
 
 # Initialize Monitor
 monitor = TrafficMonitor()
 
-# Start background thread
-thread = threading.Thread(target=monitor.update_loop, daemon=True)
-thread.start()
+def post_replay(minutes):
+    """Send replay results to the running service, which merges them into its own data."""
+    rows = [[port, minute, up, down, mask] for (port, minute), (up, down, mask) in minutes.items()]
+    req = urllib.request.Request(
+        f"http://127.0.0.1:{WEB_PORT}/api/replay",
+        data=json.dumps({"minutes": rows}).encode("utf-8"),
+        headers={"Content-Type": "application/json"}
+    )
+    with urllib.request.urlopen(req, timeout=60) as resp:
+        result = json.load(resp)
+    if not result.get("success"):
+        raise ValueError(result.get("message"))
+    return {int(port): s for port, s in result["summary"].items()}
+
+def run_replay(argv):
+    """CLI: python app.py replay <capture.pcap> [--ports 7788,8899] [--dry-run]"""
+    parser = argparse.ArgumentParser(prog="app.py replay", description="Backfill stats from a pcap/pcapng capture")
+    parser.add_argument("capture", help="pcap or pcapng file (e.g. written by tcpdump -w)")
+    parser.add_argument("--ports", help="comma separated ports (default: monitored ports)")
+    parser.add_argument("--dry-run", action="store_true", help="print per-port totals without saving")
+    args = parser.parse_args(argv)
+
+    try:
+        import pcap_replay
+    except ImportError:
+        print("Replay mode requires numpy: pip install numpy")
+        return 1
+
+    ports = [int(p) for p in args.ports.split(",")] if args.ports else sorted(monitor.ports)
+    start = time.time()
+    try:
+        agg = pcap_replay.aggregate_file(args.capture, ports)
+    except (OSError, pcap_replay.PcapError) as e:
+        print(f"Error reading capture: {e}")
+        return 1
+    elapsed = time.time() - start
+    size = os.path.getsize(args.capture)
+    print(f"Parsed {size / 2**20:.1f} MB in {elapsed:.2f}s ({size / 2**20 / max(elapsed, 1e-6):.1f} MB/s), "
+          f"{agg.packets} packets on monitored ports")
+
+    if args.dry_run:
+        for port in ports:
+            up = sum(v[0] for k, v in agg.minutes.items() if k[0] == port)
+            down = sum(v[1] for k, v in agg.minutes.items() if k[0] == port)
+            print(f"Port {port}: upload {up} B, download {down} B")
+        return 0
+
+    if monitor.acquire_lock():
+        summary = monitor.merge_replay(agg.minutes)
+    else:
+        # The service owns data/ and rewrites the data file from memory, so
+        # the merge has to happen inside it
+        try:
+            summary = post_replay(agg.minutes)
+        except (OSError, ValueError) as e:
+            print(f"Monitor service holds {LOCK_FILE} but could not be reached on port {WEB_PORT}: {e}")
+            return 1
+        print("Merged into the running monitor service")
+    for port in ports:
+        s = summary.get(port, {"minutes": 0, "skipped": 0, "upload": 0, "download": 0})
+        print(f"Port {port}: merged {s['minutes']} minutes (skipped {s['skipped']} already recorded), "
+              f"upload {s['upload']} B, download {s['download']} B")
+    return 0
 
 @app.route('/')
 def index():
@@ -420,9 +1279,38 @@ def delete_port(port):
 def system_stats():
     return jsonify(monitor.get_system_stats())
 
+@app.route('/api/containers')
+def containers():
+    return jsonify(monitor.get_container_stats())
+
+@app.route('/api/replay', methods=['POST'])
+def replay():
+    # Used by "app.py replay" while the service is running
+    try:
+        minutes = {
+            (int(port), int(minute)): [int(up), int(down), int(mask)]
+            for port, minute, up, down, mask in request.json["minutes"]
+        }
+    except (TypeError, ValueError, KeyError):
+        return jsonify({"success": False, "message": "Invalid replay data"})
+    summary = monitor.merge_replay(minutes)
+    return jsonify({"success": True, "summary": {str(port): s for port, s in summary.items()}})
+
 @app.route('/api/logs')
 def get_logs():
-    return jsonify(monitor.get_logs())
+    # ?since=<id> returns events after the cursor, ?before=<id> pages back in history
+    limit = max(1, min(request.args.get('limit', 50, type=int), 500))
+    events, has_more = monitor.get_logs(
+        since=request.args.get('since', type=int),
+        before=request.args.get('before', type=int),
+        port=request.args.get('port', type=int),
+        source=request.args.get('source'),
+        start=request.args.get('start', type=float),
+        end=request.args.get('end', type=float),
+        limit=limit
+    )
+    cursor = events[-1]["id"] if events else request.args.get('since', type=int)
+    return jsonify({"events": events, "cursor": cursor, "has_more": has_more})
 
 @app.route('/api/export/<int:port>')
 def export_history(port):
@@ -444,7 +1332,7 @@ def export_history(port):
                 date, 
                 day_data['upload'], 
                 day_data['download'], 
-                day_data['online_seconds']
+                int(day_data['online_seconds'])
             ])
             
     return Response(
@@ -480,5 +1368,22 @@ def history(port):
     return jsonify(history_data)
 
 if __name__ == '__main__':
-    print("Starting Web Monitor on http://0.0.0.0:8899")
-    app.run(host='0.0.0.0', port=8899, debug=False)
+    if len(sys.argv) > 1 and sys.argv[1] == 'replay':
+        # Merges directly, or through the service's API when it is running
+        sys.exit(run_replay(sys.argv[2:]))
+
+    if not monitor.acquire_lock():
+        print(f"Another monitor is already running on this data directory ({LOCK_FILE})")
+        sys.exit(1)
+
+    # Save counters on exit (docker stop sends SIGTERM)
+    atexit.register(monitor.shutdown)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    # Start background thread
+    thread = threading.Thread(target=monitor.update_loop, daemon=True)
+    thread.start()
+    monitor.log_event("系统", "监控服务已启动")
+
+    print(f"Starting Web Monitor on http://0.0.0.0:{WEB_PORT}")
+    app.run(host='0.0.0.0', port=WEB_PORT, debug=False)
@@ -72,6 +72,8 @@ BASE_URL="https://raw.githubusercontent.com/llulun/port-traffic-monitor/main"
 
 echo "Downloading app.py..."
 curl -s -O "$BASE_URL/app.py"
+echo "Downloading pcap_replay.py..."
+curl -s -O "$BASE_URL/pcap_replay.py"
 echo "Downloading requirements.txt..."
 curl -s -O "$BASE_URL/requirements.txt"
 echo "Downloading templates/index.html..."
@@ -0,0 +1,369 @@
+import struct
+import sys
+import numpy as np
+
+# Offline pcap/pcapng parsing for backfilling traffic stats.
+# Record boundaries are a sequential chain (each length gives the next
+# offset), so they are walked in Python with the cheapest reads available;
+# all header decoding and per-port/per-minute aggregation is done with NumPy.
+
+CHUNK_SIZE = 16 * 1024 * 1024  # bytes read per chunk
+MAX_SNAPLEN = 262144           # libpcap's largest snapshot length
+MAX_RECORD_LEN = 16 * 1024 * 1024  # longer records/blocks are treated as corruption
+
+# Link types we know how to find the IP header in
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_IPV4 = 228
+LINKTYPE_IPV6 = 229
+LINKTYPE_LINUX_SLL2 = 276
+
+PCAPNG_SHB = 0x0A0D0D0A
+PCAPNG_IDB = 0x00000001
+PCAPNG_EPB = 0x00000006
+
+# Magic -> byte order (micro- and nanosecond variants share the layout)
+_PCAP_MAGIC = {
+    b"\xd4\xc3\xb2\xa1": "<",
+    b"\xa1\xb2\xc3\xd4": ">",
+    b"\x4d\x3c\xb2\xa1": "<",
+    b"\xa1\xb2\x3c\x4d": ">",
+}
+
+
+_NATIVE = "<" if sys.byteorder == "little" else ">"
+
+
+def _u32_views(buf):
+    # One native uint32 view per alignment: the value at byte offset o is
+    # views[o & 3][o >> 2]. Indexing a memoryview is much cheaper than
+    # struct.unpack_from in the per-record walk.
+    mv = memoryview(buf)
+    return tuple(mv[r:r + ((len(buf) - r) // 4) * 4].cast("I") for r in range(4))
+
+
+class PcapError(Exception):
+    pass
+
+
+class PacketBatch:
+    """Header fields of the packets found in one chunk, as parallel arrays."""
+
+    def __init__(self, buf, data_off, caplen, origlen, seconds, linktype):
+        self.buf = buf            # uint8 view of the chunk
+        self.data_off = data_off  # offset of packet data in buf
+        self.caplen = caplen
+        self.origlen = origlen    # on-the-wire length, this is what we count
+        self.seconds = seconds    # integer unix timestamp
+        self.linktype = linktype
+
+
+def _gather_u8(buf, idx, limit):
+    # Out-of-range reads (truncated packets) are clamped and masked by the caller
+    return buf[np.minimum(idx, limit)].astype(np.int64)
+
+
+def _gather_u16(buf, idx, limit):
+    return (_gather_u8(buf, idx, limit) << 8) | _gather_u8(buf, idx + 1, limit)
+
+
+def decode_ports(batch):
+    """Return (valid, src_port, dst_port) arrays for TCP/UDP packets in a batch."""
+    buf = batch.buf
+    limit = len(buf) - 1
+    start = batch.data_off.astype(np.int64)
+    end = start + batch.caplen.astype(np.int64)
+    linktype = batch.linktype
+
+    # Locate the network header and its protocol for each link type
+    l3 = np.full(len(start), -1, dtype=np.int64)
+    ethertype = np.zeros(len(start), dtype=np.int64)
+
+    eth = linktype == LINKTYPE_ETHERNET
+    if eth.any():
+        et = _gather_u16(buf, start + 12, limit)
+        vlan = eth & ((et == 0x8100) | (et == 0x88A8))
+        l3 = np.where(eth, start + 14, l3)
+        ethertype = np.where(eth, et, ethertype)
+        if vlan.any():
+            l3 = np.where(vlan, start + 18, l3)
+            ethertype = np.where(vlan, _gather_u16(buf, start + 16, limit), ethertype)
+
+    sll = linktype == LINKTYPE_LINUX_SLL
+    if sll.any():
+        l3 = np.where(sll, start + 16, l3)
+        ethertype = np.where(sll, _gather_u16(buf, start + 14, limit), ethertype)
+
+    sll2 = linktype == LINKTYPE_LINUX_SLL2
+    if sll2.any():
+        l3 = np.where(sll2, start + 20, l3)
+        ethertype = np.where(sll2, _gather_u16(buf, start, limit), ethertype)
+
+    raw = (linktype == LINKTYPE_RAW) | (linktype == LINKTYPE_IPV4) | (linktype == LINKTYPE_IPV6)
+    if raw.any():
+        version = _gather_u8(buf, start, limit) >> 4
+        l3 = np.where(raw, start, l3)
+        ethertype = np.where(raw & (version == 4), 0x0800, ethertype)
+        ethertype = np.where(raw & (version == 6), 0x86DD, ethertype)
+
+    ipv4 = (l3 >= 0) & (ethertype == 0x0800) & (l3 + 20 <= end)
+    ipv6 = (l3 >= 0) & (ethertype == 0x86DD) & (l3 + 40 <= end)
+
+    # IPv4: variable header length, skip non-first fragments (no L4 header)
+    ihl = (_gather_u8(buf, l3, limit) & 0x0F) * 4
+    frag = _gather_u16(buf, l3 + 6, limit) & 0x1FFF
+    proto = np.where(ipv4, _gather_u8(buf, l3 + 9, limit), -1)
+    l4 = np.where(ipv4, l3 + ihl, -1)
+    ipv4 &= (ihl >= 20) & (frag == 0)
+
+    # IPv6: fixed header only, extension headers are not followed
+    proto = np.where(ipv6, _gather_u8(buf, l3 + 6, limit), proto)
+    l4 = np.where(ipv6, l3 + 40, l4)
+
+    valid = (ipv4 | ipv6) & ((proto == 6) | (proto == 17)) & (l4 + 4 <= end)
+    src_port = _gather_u16(buf, l4, limit)
+    dst_port = _gather_u16(buf, l4 + 2, limit)
+    return valid, src_port, dst_port
+
+
+def _iter_pcap(f, header, chunk_size):
+    endian = _PCAP_MAGIC[header[:4]]
+    snaplen, linktype = struct.unpack(endian + "II", header[16:24])
+    linktype &= 0x0FFFFFFF
+    incl_len = struct.Struct(endian + "I")
+    # A corrupt length would otherwise make us buffer the rest of the file
+    # waiting for the record to end
+    max_len = min(max(snaplen, MAX_SNAPLEN), MAX_RECORD_LEN)
+
+    pending = b""
+    while True:
+        data = f.read(chunk_size)
+        if not data and not pending:
+            break
+        buf = pending + data if pending else data
+        size = len(buf)
+
+        # Sequential walk: only the record boundaries, nothing else
+        offsets = []
+        add = offsets.append
+        off = 0
+        last = size - 16
+        if endian == _NATIVE:
+            views = _u32_views(buf)
+            while off <= last:
+                nxt = off + 16 + views[(off + 8) & 3][(off + 8) >> 2]
+                if nxt > size:
+                    break
+                add(off)
+                off = nxt
+        else:
+            unpack = incl_len.unpack_from
+            while off <= last:
+                nxt = off + 16 + unpack(buf, off + 8)[0]
+                if nxt > size:
+                    break
+                add(off)
+                off = nxt
+        pending = buf[off:]
+        if off <= last and incl_len.unpack_from(buf, off + 8)[0] > max_len:
+            raise PcapError(f"Corrupt pcap record length at chunk offset {off}")
+
+        if not offsets:
+            if not data:
+                break  # trailing truncated record
+            continue
+
+        u8 = np.frombuffer(buf, dtype=np.uint8)
+        hdr_off = np.array(offsets, dtype=np.int64)
+        # Decode all 16-byte record headers at once
+        hdrs = u8[hdr_off[:, None] + np.arange(16)].copy().view(endian + "u4")
+        if (hdrs[:, 2] > max_len).any():
+            raise PcapError("Corrupt pcap record length")
+        ts_sec = hdrs[:, 0].astype(np.int64)
+        yield PacketBatch(
+            u8,
+            hdr_off + 16,
+            hdrs[:, 2].astype(np.int64),
+            hdrs[:, 3].astype(np.int64),
+            ts_sec,
+            np.full(len(offsets), linktype, dtype=np.int64),
+        )
+        if not data:
+            break
+
+
+def _parse_idb(body, endian):
+    # Returns (linktype, ticks per second)
+    linktype = struct.unpack_from(endian + "H", body, 0)[0]
+    ticks = 1000000
+    pos = 8
+    while pos + 4 <= len(body):
+        code, length = struct.unpack_from(endian + "HH", body, pos)
+        if code == 0:
+            break
+        if code == 9 and length >= 1:  # if_tsresol
+            res = body[pos + 4]
+            ticks = 2 ** (res & 0x7F) if res & 0x80 else 10 ** res
+        pos += 4 + ((length + 3) & ~3)
+    return linktype, ticks
+
+
+def _epb_batch(u8, offsets, endian, interfaces):
+    blk_off = np.array(offsets, dtype=np.int64)
+    # EPB: type, len, iface, ts_high, ts_low, caplen, origlen, data...
+    fields = u8[blk_off[:, None] + np.arange(8, 28)].copy().view(endian + "u4")
+    iface = fields[:, 0].astype(np.int64)
+    if interfaces:
+        known = iface < len(interfaces)
+        iface = np.where(known, iface, 0)
+        link_table = np.array([i[0] for i in interfaces], dtype=np.int64)
+        tick_table = np.array([i[1] for i in interfaces], dtype=np.uint64)
+        linktype = np.where(known, link_table[iface], -1)
+        ticks = tick_table[iface]
+    else:
+        linktype = np.full(len(offsets), -1, dtype=np.int64)
+        ticks = np.full(len(offsets), 1000000, dtype=np.uint64)
+    ts = (fields[:, 1].astype(np.uint64) << np.uint64(32)) | fields[:, 2].astype(np.uint64)
+    return PacketBatch(
+        u8,
+        blk_off + 28,
+        fields[:, 3].astype(np.int64),
+        fields[:, 4].astype(np.int64),
+        (ts // ticks).astype(np.int64),
+        linktype,
+    )
+
+
+def _iter_pcapng(f, header, chunk_size):
+    pending = header
+    endian = "<"
+    interfaces = []  # [(linktype, ticks)] for the current section
+    eof = False
+
+    while not eof:
+        data = f.read(chunk_size)
+        eof = not data
+        buf = pending + data if pending else data
+        size = len(buf)
+
+        u8 = np.frombuffer(buf, dtype=np.uint8)
+        offsets = []
+        views = _u32_views(buf)
+        off = 0
+        while off + 12 <= size:
+            if endian == _NATIVE:
+                block_type = views[off & 3][off >> 2]
+            else:
+                block_type = struct.unpack_from(endian + "I", buf, off)[0]
+            if block_type == PCAPNG_SHB:
+                # A new section (e.g. concatenated files) may change the byte
+                # order and interface table: decode the packets seen so far first
+                if offsets:
+                    yield _epb_batch(u8, offsets, endian, interfaces)
+                    offsets = []
+                bom = buf[off + 8:off + 12]
+                if len(bom) < 4:
+                    break
+                endian = "<" if bom == b"\x4d\x3c\x2b\x1a" else ">"
+            if endian == _NATIVE:
+                block_len = views[(off + 4) & 3][(off + 4) >> 2]
+            else:
+                block_len = struct.unpack_from(endian + "I", buf, off + 4)[0]
+            if block_len < 12 or block_len > MAX_RECORD_LEN:
+                raise PcapError(f"Corrupt pcapng block length at chunk offset {off}")
+            if off + block_len > size:
+                break
+            if block_type == PCAPNG_EPB:
+                offsets.append(off)
+            elif block_type == PCAPNG_SHB:
+                interfaces = []
+            elif block_type == PCAPNG_IDB:
+                interfaces.append(_parse_idb(buf[off + 8:off + block_len - 4], endian))
+            off += block_len
+        pending = buf[off:]
+
+        if offsets:
+            yield _epb_batch(u8, offsets, endian, interfaces)
+
+
+def iter_batches(path, chunk_size=CHUNK_SIZE):
+    """Stream a pcap or pcapng file as PacketBatch objects, one per chunk."""
+    with open(path, "rb") as f:
+        header = f.read(24)
+        if len(header) < 24:
+            raise PcapError("File too short to be a capture")
+        if header[:4] in _PCAP_MAGIC:
+            yield from _iter_pcap(f, header, chunk_size)
+        elif struct.unpack("<I", header[:4])[0] == PCAPNG_SHB:
+            yield from _iter_pcapng(f, header, chunk_size)
+        else:
+            raise PcapError("Unknown capture format (expected pcap or pcapng)")
+
+
+class PortAggregator:
+    """Accumulates bytes per (monitored port, minute).
+
+    Packets sent from a monitored port count as upload, packets sent to it
+    as download, mirroring what the live monitor reports. Online seconds are
+    tracked as a 60-bit mask per minute so chunk boundaries never double count.
+    """
+
+    def __init__(self, ports):
+        self.ports = np.array(sorted(set(int(p) for p in ports)), dtype=np.int64)
+        self.minutes = {}  # {(port, minute): [upload, download, second_mask]}
+        self.packets = 0
+
+    def _match(self, port_values):
+        idx = np.searchsorted(self.ports, port_values)
+        idx = np.minimum(idx, len(self.ports) - 1)
+        return np.where(self.ports[idx] == port_values, idx, -1)
+
+    def add(self, batch):
+        if not len(self.ports) or not len(batch.data_off):
+            return
+        valid, src_port, dst_port = decode_ports(batch)
+        up_idx = np.where(valid, self._match(src_port), -1)
+        down_idx = np.where(valid, self._match(dst_port), -1)
+        up = up_idx >= 0
+        down = down_idx >= 0
+        self.packets += int(np.count_nonzero(up | down))
+
+        n_ports = len(self.ports)
+        minute = batch.seconds // 60
+        second = batch.seconds % 60
+        length = batch.origlen.astype(np.float64)
+
+        keys = np.concatenate([minute[up] * n_ports + up_idx[up], minute[down] * n_ports + down_idx[down]])
+        if not len(keys):
+            return
+        up_bytes = np.concatenate([length[up], np.zeros(np.count_nonzero(down))])
+        down_bytes = np.concatenate([np.zeros(np.count_nonzero(up)), length[down]])
+        seconds = np.concatenate([second[up], second[down]])
+
+        # Group by key: byte sums
+        ukeys, inverse = np.unique(keys, return_inverse=True)
+        up_sum = np.bincount(inverse, weights=up_bytes, minlength=len(ukeys))
+        down_sum = np.bincount(inverse, weights=down_bytes, minlength=len(ukeys))
+
+        # Group by key: OR of active-second bits (sorted so groups match ukeys)
+        sec_keys = np.unique(keys * 60 + seconds)
+        group = sec_keys // 60
+        bits = np.left_shift(np.uint64(1), (sec_keys % 60).astype(np.uint64))
+        starts = np.flatnonzero(np.concatenate([[True], group[1:] != group[:-1]]))
+        masks = np.bitwise_or.reduceat(bits, starts)
+
+        for key, u, d, mask in zip(ukeys.tolist(), up_sum.tolist(), down_sum.tolist(), masks.tolist()):
+            m, p = divmod(key, n_ports)
+            entry = self.minutes.setdefault((int(self.ports[p]), m), [0, 0, 0])
+            entry[0] += int(u)
+            entry[1] += int(d)
+            entry[2] |= mask
+
+
+def aggregate_file(path, ports, chunk_size=CHUNK_SIZE):
+    """Parse a capture and return a PortAggregator with per-minute results."""
+    agg = PortAggregator(ports)
+    for batch in iter_batches(path, chunk_size):
+        agg.add(batch)
+    return agg
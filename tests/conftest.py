@@ -0,0 +1,25 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session")
+def app_module(tmp_path_factory):
+    # app.py builds its monitor (and data/ directory) at import time
+    cwd = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp("app"))
+    try:
+        import app
+    finally:
+        os.chdir(cwd)
+    return app
+
+
+@pytest.fixture
+def monitor(app_module, tmp_path, monkeypatch):
+    """A fresh TrafficMonitor whose data files live in tmp_path."""
+    monkeypatch.chdir(tmp_path)
+    return app_module.TrafficMonitor()
@@ -0,0 +1,219 @@
+import json
+from collections import namedtuple
+from datetime import datetime
+
+import pytest
+
+CID = "0123456789ab" + "c" * 52
+IO = namedtuple("IO", "read_bytes write_bytes")
+PORT = 7788
+
+
+def write_json(path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(data))
+
+
+def test_container_id_patterns(app_module):
+    paths = {
+        f"/system.slice/docker-{CID}.scope": "docker",
+        f"/docker/{CID}": "docker",
+        f"/kubepods/burstable/pod1/cri-containerd-{CID}.scope": "containerd",
+        f"/kubepods.slice/crio-{CID}.scope": "crio",
+        f"/machine.slice/libpod-{CID}.scope/container": "libpod",
+    }
+    for path, runtime in paths.items():
+        found_runtime, cid = app_module.CONTAINER_ID_RE.findall(path)[-1]
+        assert cid == CID
+        assert (found_runtime or None) == runtime
+    assert not app_module.CONTAINER_ID_RE.findall("/user.slice/user-0.slice")
+
+
+def test_read_container_name(app_module, tmp_path, monkeypatch):
+    monkeypatch.setattr(app_module, "DOCKER_STATE_DIR", str(tmp_path / "docker"))
+    monkeypatch.setattr(app_module, "CRIO_STATE_DIR", str(tmp_path / "crio"))
+    monkeypatch.setattr(app_module, "CONTAINERD_STATE_DIR", str(tmp_path / "containerd"))
+    monkeypatch.setattr(app_module, "PODMAN_STATE_FILE", str(tmp_path / "podman.json"))
+
+    write_json(tmp_path / "docker" / CID / "config.v2.json", {"Name": "/web-1", "Config": {"Labels": {}}})
+    write_json(tmp_path / "crio" / CID / "userdata" / "config.json",
+               {"annotations": {"io.kubernetes.container.name": "api"}})
+    write_json(tmp_path / "containerd" / "default" / CID / "config.json",
+               {"annotations": {"nerdctl/name": "worker"}})
+    write_json(tmp_path / "podman.json", [{"id": CID, "names": ["db"]}])
+
+    assert app_module.read_container_identity(CID, "docker") == ("web-1", "web-1")
+    assert app_module.read_container_identity(CID, "crio") == ("api", "api")
+    assert app_module.read_container_identity(CID, "containerd") == ("worker", "worker")
+    assert app_module.read_container_identity(CID, "libpod") == ("db", "db")
+    # No state files: fall back to the short ID
+    assert app_module.read_container_identity("f" * 64, "containerd") == ("f" * 12, "f" * 12)
+
+
+def test_kubernetes_containers_keyed_by_namespace_and_pod(app_module, tmp_path, monkeypatch):
+    monkeypatch.setattr(app_module, "DOCKER_STATE_DIR", str(tmp_path / "docker"))
+    monkeypatch.setattr(app_module, "CRIO_STATE_DIR", str(tmp_path / "crio"))
+    monkeypatch.setattr(app_module, "CONTAINERD_STATE_DIR", str(tmp_path / "containerd"))
+    docker_id, crio_id, containerd_id = "a" * 64, "b" * 64, "c" * 64
+
+    write_json(tmp_path / "docker" / docker_id / "config.v2.json", {"Name": "/k8s_app_x", "Config": {"Labels": {
+        "io.kubernetes.pod.namespace": "t1", "io.kubernetes.pod.name": "web-0", "io.kubernetes.container.name": "app"}}})
+    write_json(tmp_path / "crio" / crio_id / "userdata" / "config.json", {"annotations": {
+        "io.kubernetes.pod.namespace": "t2", "io.kubernetes.pod.name": "web-0", "io.kubernetes.container.name": "app"}})
+    write_json(tmp_path / "containerd" / "k8s.io" / containerd_id / "config.json", {"annotations": {
+        "io.kubernetes.cri.sandbox-namespace": "t3", "io.kubernetes.cri.sandbox-name": "api-1",
+        "io.kubernetes.cri.container-name": "app"}})
+
+    assert app_module.read_container_identity(docker_id, "docker") == ("t1/web-0/app", "app")
+    assert app_module.read_container_identity(crio_id, "crio") == ("t2/web-0/app", "app")
+    assert app_module.read_container_identity(containerd_id, "containerd") == ("t3/api-1/app", "app")
+    # cgroupfs paths have no runtime prefix: every runtime's state is tried
+    assert app_module.read_container_identity(crio_id) == ("t2/web-0/app", "app")
+    assert app_module.read_container_identity(containerd_id) == ("t3/api-1/app", "app")
+
+
+def test_cgroupfs_path_has_no_runtime(app_module, monkeypatch, tmp_path):
+    cgroup = tmp_path / "cgroup"
+    cgroup.write_text(f"11:memory:/kubepods/burstable/pod1b2c3d4e-0000-1111-2222-333344445555/{CID}\n")
+    real_open = open
+    monkeypatch.setattr("builtins.open", lambda path, *a, **k: real_open(
+        cgroup if path == "/proc/42/cgroup" else path, *a, **k))
+
+    assert app_module.read_container_id(42) == (CID, None)
+
+
+class FakeProcess:
+    def __init__(self, pid):
+        self.pid = pid
+        self.read = 0
+        self.write = 0
+
+    def create_time(self):
+        return 1000 + self.pid
+
+    def name(self):
+        return "srv"
+
+    def is_running(self):
+        return True
+
+    def io_counters(self):
+        return IO(self.read, self.write)
+
+
+@pytest.fixture
+def containerized(monitor, app_module, tmp_path, monkeypatch):
+    """Monitor watching PORT whose processes run in fake containers."""
+    monkeypatch.setattr(app_module, "DOCKER_STATE_DIR", str(tmp_path / "docker"))
+    monkeypatch.setattr(app_module, "CRIO_STATE_DIR", str(tmp_path / "crio"))
+    monkeypatch.setattr(app_module, "CONTAINERD_STATE_DIR", str(tmp_path / "containerd"))
+    monkeypatch.setattr(app_module, "PODMAN_STATE_FILE", str(tmp_path / "podman.json"))
+    state = {"procs": {}, "cgroups": {}, "conns": {}, "cgroup_reads": []}
+
+    def add(pid, cid, runtime, conns):
+        state["procs"][pid] = FakeProcess(pid)
+        state["cgroups"][pid] = (cid, runtime)
+        state["conns"][pid] = conns
+        return state["procs"][pid]
+
+    def fake_read_container_id(pid):
+        state["cgroup_reads"].append(pid)
+        return state["cgroups"].get(pid)
+
+    def fake_scan():
+        return {PORT: {"pids": sorted(state["procs"]), "conns": sum(state["conns"].values()),
+                       "pid_conns": dict(state["conns"])}}
+
+    def remove(pid):
+        for table in ("procs", "cgroups", "conns"):
+            del state[table][pid]
+
+    monkeypatch.setattr(app_module.psutil, "Process", lambda pid: state["procs"][pid])
+    monkeypatch.setattr(app_module, "read_container_id", fake_read_container_id)
+    monkeypatch.setattr(monitor, "get_port_pids_and_conns", fake_scan)
+    monitor.add_port(PORT)
+
+    def update():
+        monitor.last_scan = 0  # force a socket scan every call
+        monitor.update([PORT])
+
+    return monitor, state, add, remove, update
+
+
+def test_update_aggregates_per_container(containerized, tmp_path):
+    monitor, state, add, remove, update = containerized
+    old_id, new_id, tenant1, tenant2 = "1" * 64, "2" * 64, "3" * 64, "4" * 64
+    for cid in (old_id, new_id):
+        write_json(tmp_path / "docker" / cid / "config.v2.json", {"Name": "/web", "Config": {"Labels": {}}})
+    for cid, namespace in ((tenant1, "t1"), (tenant2, "t2")):
+        write_json(tmp_path / "crio" / cid / "userdata" / "config.json", {"annotations": {
+            "io.kubernetes.pod.namespace": namespace, "io.kubernetes.pod.name": "nginx-0",
+            "io.kubernetes.container.name": "nginx"}})
+
+    web_a = add(10, old_id, "docker", 2)
+    web_b = add(11, old_id, "docker", 3)
+    nginx1 = add(12, tenant1, None, 1)  # cgroupfs path, runtime unknown
+    nginx2 = add(13, tenant2, None, 4)
+    update()  # baseline
+    for _ in range(3):
+        web_a.write += 100
+        web_b.read += 50
+        nginx1.write += 7
+        nginx2.write += 9
+        update()
+
+    # Cached processes never hit /proc/<pid>/cgroup again
+    assert sorted(state["cgroup_reads"]) == [10, 11, 12, 13]
+    live = {c["key"]: c for c in monitor.get_container_stats()}
+    assert live["web"]["ids"] == [old_id[:12]]
+    assert live["web"]["connections"] == 5
+    assert sorted(live["web"]["pids"]) == [10, 11]
+    assert live["t1/nginx-0/nginx"]["name"] == "nginx"
+    assert live["t1/nginx-0/nginx"]["total_upload"] == 21
+    assert live["t2/nginx-0/nginx"]["total_upload"] == 27
+    assert live["t2/nginx-0/nginx"]["connections"] == 4
+
+    # Redeploy: new container ID, same name, totals carry on
+    remove(10)
+    remove(11)
+    web_c = add(20, new_id, "docker", 1)
+    update()  # baseline for the new process
+    web_c.write += 1000
+    update()
+
+    live = {c["key"]: c for c in monitor.get_container_stats()}
+    assert live["web"]["ids"] == [new_id[:12]]
+    assert live["web"]["total_upload"] == 1300
+    assert live["web"]["total_download"] == 150
+    assert live["web"]["connections"] == 1
+    assert old_id[:12] not in monitor.container_names
+
+
+def test_prune_container_cache_evicts_names(monitor):
+    monitor.container_cache = {
+        "10_100": {"id": "aaaaaaaaaaaa", "key": "web", "name": "web"},
+        "11_100": {"id": "bbbbbbbbbbbb", "key": "old", "name": "old"},
+        "12_100": None,
+    }
+    monitor.container_names = {"aaaaaaaaaaaa": ("web", "web"), "bbbbbbbbbbbb": ("old", "old")}
+
+    monitor.prune_container_cache({"10_100", "12_100"})
+
+    assert set(monitor.container_cache) == {"10_100", "12_100"}
+    assert monitor.container_names == {"aaaaaaaaaaaa": ("web", "web")}
+
+
+def test_prune_container_stats(monitor, app_module):
+    monitor.data["container_stats"] = {
+        "web": {"upload": 1, "download": 2, "last_seen": "2026-03-30"},
+        "gone": {"upload": 1, "download": 2, "last_seen": "2026-01-01"},
+    }
+    monitor.data["container_daily_stats"] = {
+        "2026-01-01": {"gone": {"upload": 1, "download": 2}},
+        "2026-03-30": {"web": {"upload": 1, "download": 2}},
+    }
+
+    monitor.prune_container_stats(datetime(2026, 4, 1))
+
+    assert list(monitor.data["container_stats"]) == ["web"]
+    assert list(monitor.data["container_daily_stats"]) == ["2026-03-30"]
@@ -0,0 +1,147 @@
+import json
+import os
+
+import pytest
+
+
+@pytest.fixture
+def small_segments(app_module, monkeypatch):
+    # ~8 events per segment so rotation kicks in quickly
+    monkeypatch.setattr(app_module, "EVENT_SEGMENT_BYTES", 1024)
+    monkeypatch.setattr(app_module, "EVENT_INDEX_STRIDE", 4)
+    monkeypatch.setattr(app_module, "EVENT_MAX_SEGMENTS", 4)
+    monkeypatch.setattr(app_module, "EVENT_TAIL_SIZE", 5)
+    return app_module
+
+
+def make_log(app_module, directory):
+    return app_module.EventLog(str(directory))
+
+
+def fill(log, count):
+    for i in range(count):
+        log.append("端口" if i % 3 else "系统", f"event {i}", port=7788 if i % 2 else 8899)
+
+
+def segment_files(directory):
+    return sorted(n for n in os.listdir(directory) if n.endswith(".jsonl"))
+
+
+def ids(events):
+    return [e["id"] for e in events]
+
+
+def test_rotation_drops_oldest_segments(small_segments, tmp_path):
+    log = make_log(small_segments, tmp_path)
+    fill(log, 100)
+    files = segment_files(tmp_path)
+    assert len(files) == 4
+    assert len(log.segments) == 4
+    # Sealed segments get a sidecar index, the active one does not
+    assert len([n for n in os.listdir(tmp_path) if n.endswith(".idx.json")]) == 3
+    first = log.segments[0]["first_id"]
+    assert first > 1
+    events, has_more = log.query(since=0, limit=1000)
+    assert ids(events) == list(range(first, 101))
+    assert not has_more
+
+
+def test_reload_after_restart(small_segments, tmp_path):
+    log = make_log(small_segments, tmp_path)
+    fill(log, 30)
+    before, _ = log.query(since=0, limit=1000)
+
+    log = make_log(small_segments, tmp_path)
+    assert log.next_id == 31
+    after, _ = log.query(since=0, limit=1000)
+    assert after == before
+    assert log.append("系统", "restarted")["id"] == 31
+
+
+def test_reload_rebuilds_missing_index(small_segments, tmp_path):
+    log = make_log(small_segments, tmp_path)
+    fill(log, 30)
+    for name in os.listdir(tmp_path):
+        if name.endswith(".idx.json"):
+            os.remove(tmp_path / name)
+    log = make_log(small_segments, tmp_path)
+    events, _ = log.query(since=0, port=7788, limit=1000)
+    assert ids(events) == list(range(2, 31, 2))
+
+
+def test_torn_write_is_truncated(small_segments, tmp_path):
+    log = make_log(small_segments, tmp_path)
+    fill(log, 3)
+    path = tmp_path / segment_files(tmp_path)[-1]
+    with open(path, "ab") as f:
+        f.write(b'{"id": 4, "ts": 1')  # crash mid-write
+
+    log = make_log(small_segments, tmp_path)
+    assert log.next_id == 4
+    log.append("系统", "after crash")
+    with open(path, "rb") as f:
+        lines = f.read().splitlines()
+    assert [json.loads(line)["id"] for line in lines] == [1, 2, 3, 4]
+
+    log = make_log(small_segments, tmp_path)
+    events, _ = log.query(since=0, limit=10)
+    assert ids(events) == [1, 2, 3, 4]
+    assert events[-1]["message"] == "after crash"
+
+
+def test_since_pages_forward(small_segments, tmp_path):
+    log = make_log(small_segments, tmp_path)
+    fill(log, 40)
+    seen = []
+    cursor = 0
+    while True:
+        events, has_more = log.query(since=cursor, limit=7)
+        seen += ids(events)
+        if not has_more:
+            break
+        cursor = events[-1]["id"]
+    assert seen == list(range(log.segments[0]["first_id"], 41))
+
+
+def test_before_pages_backward(small_segments, tmp_path):
+    log = make_log(small_segments, tmp_path)
+    fill(log, 40)
+    events, has_more = log.query(limit=6)
+    assert ids(events) == list(range(35, 41))
+    assert has_more
+    seen = ids(events)
+    while has_more:
+        events, has_more = log.query(before=events[0]["id"], limit=6)
+        seen = ids(events) + seen
+    assert seen == list(range(log.segments[0]["first_id"], 41))
+
+
+def test_port_and_source_filters(small_segments, tmp_path):
+    log = make_log(small_segments, tmp_path)
+    fill(log, 40)
+    events, has_more = log.query(port=8899, limit=5)
+    assert ids(events) == [31, 33, 35, 37, 39]
+    assert has_more
+    events, _ = log.query(before=31, port=8899, limit=3)
+    assert ids(events) == [25, 27, 29]
+    events, _ = log.query(since=10, port=7788, source="系统", limit=100)
+    assert ids(events) == [i + 1 for i in range(10, 40) if i % 2 and i % 3 == 0]
+    assert log.query(port=9999)[0] == []
+
+
+def test_has_more_only_when_older_matches_exist(small_segments, tmp_path):
+    log = make_log(small_segments, tmp_path)
+    for i in range(20):
+        log.append("端口", f"event {i}", port=8899)
+    log.append("端口", "only one", port=7788)
+    log.append("端口", "after", port=8899)
+
+    # The active segment's index lists 7788, but its only event is on this page
+    events, has_more = log.query(port=7788, limit=1)
+    assert ids(events) == [21]
+    assert not has_more
+
+    log.append("端口", "second", port=7788)
+    events, has_more = log.query(port=7788, limit=1)
+    assert ids(events) == [23]
+    assert has_more
@@ -0,0 +1,240 @@
+import struct
+
+import pytest
+
+np = pytest.importorskip("numpy")
+import pcap_replay
+
+BASE = 1700000000  # 2023-11-14 22:13:20 UTC, a minute boundary is at +40s
+PORTS = [7788, 8899]
+
+
+def tcp4(sport, dport, payload, vlan=False):
+    tcp = struct.pack("!HHIIBBHHH", sport, dport, 0, 0, 0x50, 0x18, 0, 0, 0) + b"x" * payload
+    ip = struct.pack("!BBHHHBBH4s4s", 0x45, 0, 20 + len(tcp), 0, 0, 64, 6, 0, b"\x0a\0\0\x01", b"\x0a\0\0\x02")
+    eth = b"\0" * 12 + (b"\x81\x00\x00\x01" if vlan else b"") + b"\x08\x00"
+    return eth + ip + tcp
+
+
+def udp6(sport, dport, payload):
+    udp = struct.pack("!HHHH", sport, dport, 8 + payload, 0) + b"y" * payload
+    ip6 = struct.pack("!IHBB16s16s", 6 << 28, len(udp), 17, 64, b"\0" * 16, b"\0" * 16)
+    return b"\0" * 12 + b"\x86\xdd" + ip6 + udp
+
+
+# (seconds after BASE, frame)
+PACKETS = [
+    (0.1, tcp4(7788, 50000, 100)),               # upload on 7788
+    (0.5, tcp4(50000, 7788, 10, vlan=True)),     # download on 7788 via VLAN
+    (2.0, udp6(8899, 1234, 300)),                # upload on 8899 via IPv6
+    (2.2, tcp4(80, 443, 500)),                   # not monitored
+    (45.0, tcp4(50000, 7788, 1000)),             # next minute
+    (45.5, udp6(1234, 8899, 40)),
+]
+
+
+def write_pcap(path, packets):
+    with open(path, "wb") as f:
+        f.write(struct.pack("<IHHiIII", 0xA1B2C3D4, 2, 4, 0, 0, 65535, 1))
+        for offset, frame in packets:
+            ts = BASE + offset
+            f.write(struct.pack("<IIII", int(ts), int((ts % 1) * 1e6), len(frame), len(frame)) + frame)
+
+
+def pcapng_section(packets, endian="<", linktype=pcap_replay.LINKTYPE_ETHERNET):
+    def block(block_type, body):
+        body += b"\0" * (-len(body) % 4)
+        return struct.pack(endian + "II", block_type, 12 + len(body)) + body + struct.pack(endian + "I", 12 + len(body))
+
+    out = block(pcap_replay.PCAPNG_SHB, struct.pack(endian + "IHHq", 0x1A2B3C4D, 1, 0, -1))
+    # if_tsresol = 9 (nanoseconds)
+    idb = struct.pack(endian + "HHI", linktype, 0, 65535) + struct.pack(endian + "HH", 9, 1) + b"\x09\0\0\0"
+    out += block(pcap_replay.PCAPNG_IDB, idb + struct.pack(endian + "HH", 0, 0))
+    for offset, frame in packets:
+        ts = int(round((BASE + offset) * 1e9))
+        body = struct.pack(endian + "IIIII", 0, ts >> 32, ts & 0xFFFFFFFF, len(frame), len(frame)) + frame
+        out += block(pcap_replay.PCAPNG_EPB, body)
+    return out
+
+
+def write_pcapng(path, packets):
+    with open(path, "wb") as f:
+        f.write(pcapng_section(packets))
+
+
+def expected_minutes():
+    sizes = [len(frame) for _, frame in PACKETS]
+    m0, m1 = BASE // 60, BASE // 60 + 1
+    return {
+        (7788, m0): [sizes[0], sizes[1], 1 << (BASE % 60)],
+        (8899, m0): [sizes[2], 0, 1 << ((BASE + 2) % 60)],
+        (7788, m1): [0, sizes[4], 1 << ((BASE + 45) % 60)],
+        (8899, m1): [0, sizes[5], 1 << ((BASE + 45) % 60)],
+    }
+
+
+@pytest.mark.parametrize("writer", [write_pcap, write_pcapng])
+@pytest.mark.parametrize("chunk_size", [64, 1000, pcap_replay.CHUNK_SIZE])
+def test_aggregate_file(tmp_path, writer, chunk_size):
+    path = tmp_path / "capture"
+    writer(path, PACKETS)
+
+    agg = pcap_replay.aggregate_file(str(path), PORTS, chunk_size)
+
+    assert agg.minutes == expected_minutes()
+    assert agg.packets == 5
+
+
+def test_online_seconds_not_double_counted_across_chunks(tmp_path):
+    # Many packets in the same two seconds, split over many tiny chunks
+    packets = [(0.01 * i, tcp4(7788, 50000, 20)) for i in range(150)]
+    path = tmp_path / "capture.pcap"
+    write_pcap(path, packets)
+
+    agg = pcap_replay.aggregate_file(str(path), [7788], chunk_size=100)
+
+    (entry,) = agg.minutes.values()
+    assert entry[0] == sum(len(frame) for _, frame in packets)
+    assert bin(entry[2]).count("1") == 2
+
+
+def test_rejects_unknown_format(tmp_path):
+    path = tmp_path / "bogus"
+    path.write_bytes(b"\0" * 64)
+    with pytest.raises(pcap_replay.PcapError):
+        pcap_replay.aggregate_file(str(path), PORTS)
+
+
+@pytest.mark.parametrize("chunk_size", [64, pcap_replay.CHUNK_SIZE])
+def test_pcapng_sections_decoded_with_their_own_byte_order(tmp_path, chunk_size):
+    # Concatenated captures: a little-endian Ethernet section followed by a
+    # big-endian raw IP section, usually both within one chunk
+    first, second = PACKETS[:3], PACKETS[3:]
+    raw = [(offset, frame[14:]) for offset, frame in second]
+    path = tmp_path / "joined.pcapng"
+    path.write_bytes(pcapng_section(first) + pcapng_section(raw, ">", pcap_replay.LINKTYPE_RAW))
+
+    agg = pcap_replay.aggregate_file(str(path), PORTS, chunk_size)
+
+    sizes = [len(frame) for _, frame in PACKETS]
+    expected = expected_minutes()
+    expected[(7788, BASE // 60 + 1)][1] = sizes[4] - 14
+    expected[(8899, BASE // 60 + 1)][1] = sizes[5] - 14
+    assert agg.minutes == expected
+
+
+@pytest.mark.parametrize("chunk_size", [64, 4096])
+def test_rejects_corrupt_pcap_record_length(tmp_path, chunk_size):
+    path = tmp_path / "corrupt.pcap"
+    write_pcap(path, PACKETS[:2])
+    with open(path, "ab") as f:
+        f.write(struct.pack("<IIII", BASE, 0, 0xFFFFFFF0, 0xFFFFFFF0) + b"\0" * 100000)
+
+    with pytest.raises(pcap_replay.PcapError):
+        pcap_replay.aggregate_file(str(path), PORTS, chunk_size)
+
+
+@pytest.mark.parametrize("chunk_size", [64, 4096])
+def test_rejects_corrupt_pcapng_block_length(tmp_path, chunk_size):
+    path = tmp_path / "corrupt.pcapng"
+    write_pcapng(path, PACKETS[:2])
+    with open(path, "ab") as f:
+        f.write(struct.pack("<II", pcap_replay.PCAPNG_EPB, 0xFFFFFFF0) + b"\0" * 100000)
+
+    with pytest.raises(pcap_replay.PcapError):
+        pcap_replay.aggregate_file(str(path), PORTS, chunk_size)
+
+
+def test_merge_replay(tmp_path, monitor):
+    path = tmp_path / "capture.pcap"
+    write_pcap(path, PACKETS)
+    agg = pcap_replay.aggregate_file(str(path), PORTS)
+
+    summary = monitor.merge_replay(agg.minutes)
+
+    sizes = [len(frame) for _, frame in PACKETS]
+    total = monitor.data["total_stats"]["7788"]
+    assert summary[7788]["minutes"] == 2
+    assert total["upload"] == sizes[0]
+    assert total["download"] == sizes[1] + sizes[4]
+    assert total["online_seconds"] == 2
+    assert len(monitor.data["traffic_series"]["7788"]) == 2
+
+
+def test_merge_replay_is_idempotent_beyond_series_window(tmp_path, monitor):
+    path = tmp_path / "capture.pcap"
+    write_pcap(path, PACKETS)
+    agg = pcap_replay.aggregate_file(str(path), PORTS)
+
+    monitor.merge_replay(agg.minutes)
+    before = dict(monitor.data["total_stats"]["7788"])
+    # A full day of newer live points pushes the replayed minutes out of the series
+    monitor.data["traffic_series"]["7788"] = [
+        {"time": "00:00", "up": 0, "down": 0, "full_time": f"2030-01-01 {i // 60:02d}:{i % 60:02d}"}
+        for i in range(1440)
+    ]
+
+    summary = monitor.merge_replay(agg.minutes)
+
+    assert summary[7788]["minutes"] == 0
+    assert summary[7788]["skipped"] == 2
+    assert monitor.data["total_stats"]["7788"] == before
+
+
+def test_merge_replay_skips_minutes_recorded_live(monitor, app_module):
+    minute = BASE // 60
+    app_module.coverage_add(monitor.data["minute_coverage"].setdefault("7788", []), minute)
+
+    summary = monitor.merge_replay({(7788, minute): [100, 200, 1], (7788, minute + 1): [10, 20, 1]})
+
+    assert summary[7788] == {"minutes": 1, "skipped": 1, "upload": 10, "download": 20}
+
+
+def test_data_directory_lock_is_exclusive(monitor, app_module):
+    other = app_module.TrafficMonitor()
+    try:
+        assert monitor.acquire_lock()
+        assert not other.acquire_lock()
+    finally:
+        monitor.lock_file.close()
+
+
+def test_replay_endpoint_merges_into_running_service(tmp_path, monitor, app_module, monkeypatch):
+    path = tmp_path / "capture.pcap"
+    write_pcap(path, PACKETS)
+    agg = pcap_replay.aggregate_file(str(path), PORTS)
+    rows = [[p, m, u, d, mask] for (p, m), (u, d, mask) in agg.minutes.items()]
+    monkeypatch.setattr(app_module, "monitor", monitor)
+    client = app_module.app.test_client()
+
+    result = client.post("/api/replay", json={"minutes": rows}).get_json()
+
+    assert result["success"]
+    assert result["summary"]["7788"]["minutes"] == 2
+    assert monitor.data["total_stats"]["8899"]["upload"] == len(PACKETS[2][1])
+    assert not client.post("/api/replay", json={"minutes": [[1, 2]]}).get_json()["success"]
+
+
+def test_run_replay_forwards_to_running_service(tmp_path, monitor, app_module, monkeypatch):
+    path = tmp_path / "capture.pcap"
+    write_pcap(path, PACKETS)
+    service = app_module.TrafficMonitor()
+    assert service.acquire_lock()
+    sent = []
+
+    def fake_post(minutes):
+        sent.append(minutes)
+        return service.merge_replay(minutes)
+
+    monkeypatch.setattr(app_module, "monitor", monitor)
+    monkeypatch.setattr(app_module, "post_replay", fake_post)
+    try:
+        assert app_module.run_replay([str(path), "--ports", "7788,8899"]) == 0
+    finally:
+        service.lock_file.close()
+
+    assert sent == [pcap_replay.aggregate_file(str(path), PORTS).minutes]
+    # The replay process neither merged nor logged anything itself
+    assert "7788" not in monitor.data.get("total_stats", {})
+    assert service.data["total_stats"]["7788"]["download"] == len(PACKETS[1][1]) + len(PACKETS[4][1])
+    assert monitor.events.next_id == service.events.next_id - 1
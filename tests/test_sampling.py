@@ -0,0 +1,114 @@
+import json
+import time
+from collections import namedtuple
+from datetime import datetime
+
+import pytest
+
+IO = namedtuple("IO", "read_bytes write_bytes")
+PORT = 7788
+
+
+class FakeProcess:
+    def __init__(self):
+        self.read = 0
+        self.write = 0
+
+    def io_counters(self):
+        return IO(self.read, self.write)
+
+    def is_running(self):
+        return True
+
+
+@pytest.fixture
+def sampled(monitor, monkeypatch):
+    """Monitor watching PORT with one fake process; counts socket scans."""
+    proc = FakeProcess()
+    scans = []
+
+    def fake_scan():
+        scans.append(1)
+        return {PORT: {"pids": [42], "conns": 1, "pid_conns": {42: 1}}}
+
+    def fake_refresh():
+        monitor.processes = {42: {"proc": proc, "key": "42_1", "name": "srv", "container": None}}
+
+    monkeypatch.setattr(monitor, "get_port_pids_and_conns", fake_scan)
+    monkeypatch.setattr(monitor, "refresh_processes", fake_refresh)
+    monitor.add_port(PORT)
+    monitor.update([PORT])  # baseline sample
+    return monitor, proc, scans
+
+
+def test_burst_ticks_reuse_socket_scan(sampled):
+    monitor, proc, scans = sampled
+    for _ in range(10):
+        proc.write += 1000
+        monitor.update([PORT])
+
+    assert len(scans) == 1
+    assert monitor.data["total_stats"][str(PORT)]["upload"] == 10000
+
+
+def test_online_seconds_capped_on_backed_off_port(sampled):
+    monitor, proc, _ = sampled
+    monitor.last_sample[PORT] = time.monotonic() - 10  # port was backed off
+    proc.read += 500
+
+    monitor.update([PORT])
+
+    total = monitor.data["total_stats"][str(PORT)]
+    assert total["download"] == 500
+    assert total["online_seconds"] == pytest.approx(1)
+
+
+def test_chunky_traffic_does_not_keep_burst_mode(monitor):
+    now = 1000.0
+    for i in range(10):  # settle the baseline at 1 MB/s
+        monitor.schedule_next(PORT, now, 1_000_000, 1.0, 0)
+        now += 1.0
+    monitor.schedule_next(PORT, now, 5_000_000, 1.0, 0)  # sharp jump
+    assert monitor.schedule[PORT]["interval"] == pytest.approx(0.1)
+
+    # Alternate 0 and 2 MB/s every 100ms: averages to the baseline per window
+    for i in range(200):
+        now += 0.1
+        monitor.schedule_next(PORT, now, 200_000 if i % 2 else 0, 0.1, 0)
+
+    assert monitor.schedule[PORT]["burst_until"] < now
+    assert monitor.schedule[PORT]["interval"] == 1
+    burst_logs = [e for e in monitor.get_logs(port=PORT)[0] if "高频" in e["message"]]
+    assert len(burst_logs) == 1
+
+
+def test_idle_port_backs_off(monitor):
+    now = 1000.0
+    intervals = []
+    for _ in range(6):
+        monitor.schedule_next(PORT, now, 0, monitor.schedule.get(PORT, {}).get("interval", 1), 0)
+        intervals.append(monitor.schedule[PORT]["interval"])
+        now = monitor.schedule[PORT]["next"]
+    assert intervals == [2, 4, 8, 10, 10, 10]
+
+
+def test_roll_minute_splits_samples_at_boundary(monitor):
+    monitor.roll_minute("1", datetime(2026, 1, 1, 10, 0, 58), 1.0, 100, 0)
+    monitor.roll_minute("1", datetime(2026, 1, 1, 10, 1, 2), 4.0, 400, 40)
+
+    (point,) = monitor.data["traffic_series"]["1"]
+    assert point["full_time"] == "2026-01-01 10:00"
+    assert point["up"] == pytest.approx(100)  # 300 bytes over 3 sampled seconds
+    assert point["peak_down"] == pytest.approx(10)
+    assert monitor.minute_buckets["1"]["seconds"] == pytest.approx(2)
+
+
+def test_shutdown_saves_pending_counters(sampled, app_module):
+    monitor, proc, _ = sampled
+    proc.write += 123
+    monitor.update([PORT])  # within SAVE_INTERVAL, not written yet
+
+    monitor.shutdown()
+
+    with open(app_module.DATA_FILE) as f:
+        assert json.load(f)["total_stats"][str(PORT)]["upload"] == 123